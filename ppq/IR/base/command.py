@@ -94,6 +94,9 @@ class GraphCommandType(Enum):
     FORMAT_CONSTANT_INPUT = 28
     # 将 opset1 的 slice 弄成 opset 11 的
     FORMAT_SLICE = 29
+    # 一次遍历完成 cast, slice, clip 的格式化，等价于依次执行 FORMAT_CAST, FORMAT_SLICE, FORMAT_CLIP
+    # format cast, slice, clip within a single traversal, same as FORMAT_CAST, FORMAT_SLICE, FORMAT_CLIP
+    FORMAT_CAST_SLICE_CLIP = 30
 
 class GraphCommand():
     def __init__(self, command_type: GraphCommandType, **kwargs) -> None:
@@ -88,7 +88,8 @@ class GraphFormatter(GraphCommandProcesser):
             GraphCommandType.REPLACE_SUB,
             GraphCommandType.FORMAT_PARAMETERS,
             GraphCommandType.FORMAT_CONSTANT_INPUT,
-            GraphCommandType.FORMAT_SLICE
+            GraphCommandType.FORMAT_SLICE,
+            GraphCommandType.FORMAT_CAST_SLICE_CLIP
         ]
 
     def process(self, command: GraphCommand) -> Any:
@@ -112,23 +113,41 @@ class GraphFormatter(GraphCommandProcesser):
             return self.format_constant_input()
         if command.command_type == GraphCommandType.FORMAT_SLICE:
             return self.format_slice()
+        if command.command_type == GraphCommandType.FORMAT_CAST_SLICE_CLIP:
+            return self.format_cast_slice_clip()
 
-    def format_slice(self) -> None:
+    def format_cast_slice_clip(self) -> None:
         """
-            Slice: opset1 格式跟其他的不太一样，这个 pass 将 opset1 的 slice 强行转换为 opset 11
+            只遍历一次算子列表，将 cast, slice, clip 算子分发给各自的处理函数，
+                结果与依次调用 format_cast, format_slice, format_clip 相同。
+            walk graph operations only once and dispatch cast, slice, clip operations to their handlers,
+                result is the same as calling format_cast, format_slice, format_clip one by one.
         """
-        interested_ops = []
+        casts, slices, clips = [], [], []
         for operation in self.graph.operations.values():
-            if operation.type == 'Slice':
-                if 'starts' in operation.attributes:
-                    assert 'starts' in operation.attributes and 'ends' in operation.attributes, (
-                        f'Invalid Slice Operation Format, Slice operation is expected to have axes, '
-                        'starts and ends attributes with opset 1, '
-                        f'however your operation {operation.name}, do not have completed attributes')
-                    interested_ops.append(operation)
+            if operation.type == 'Cast': casts.append(operation)
+            elif operation.type == 'Slice' and 'starts' in operation.attributes: slices.append(operation)
+            elif operation.type == 'Clip' and ('min' in operation.attributes or 'max' in operation.attributes):
+                clips.append(operation)
+
+        self.format_cast(interested_ops=casts)
+        self.format_slice(interested_ops=slices)
+        self.format_clip(interested_ops=clips)
+
+    def format_slice(self, interested_ops: List[Operation] = None) -> None:
+        """
+            Slice: opset1 格式跟其他的不太一样，这个 pass 将 opset1 的 slice 强行转换为 opset 11
+        """
+        if interested_ops is None:
+            interested_ops = [operation for operation in self.graph.operations.values()
+                              if operation.type == 'Slice' and 'starts' in operation.attributes]
 
         for slice in interested_ops:
             assert isinstance(slice, Operation)
+            assert 'ends' in slice.attributes, (
+                f'Invalid Slice Operation Format, Slice operation is expected to have axes, '
+                'starts and ends attributes with opset 1, '
+                f'however your operation {slice.name}, do not have completed attributes')
             axes   = slice.attributes.get('axes', None)
             starts = slice.attributes['starts']
             ends   = slice.attributes['ends']
@@ -179,7 +198,7 @@ class GraphFormatter(GraphCommandProcesser):
                 operation.attributes['pads'] = convert_any_to_python_primary_type(pads)
             if padding_mode == 'constant': operation.attributes['pads_value'] = padding_value
 
-    def format_clip(self) -> None:
+    def format_clip(self, interested_ops: List[Operation] = None) -> None:
         """
             对于不同的模型格式, clip 算子将有两种不同的输入格式：
             for different models, possibly clip op has the following input formats
@@ -194,11 +213,11 @@ class GraphFormatter(GraphCommandProcesser):
             当 min, max 参数由 第二、第三个输入变量给出时，其中一个为空时直接返回 ValueError
             ValueError will be raised when any of min, max parameters is null
         """
-        
-        interested_ops = []
-        for _, operation in self.graph.operations.items():
-            if operation.type == 'Clip' and ('min' in operation.attributes or 'max' in operation.attributes): 
-                interested_ops.append(operation)
+        if interested_ops is None:
+            interested_ops = []
+            for _, operation in self.graph.operations.items():
+                if operation.type == 'Clip' and ('min' in operation.attributes or 'max' in operation.attributes): 
+                    interested_ops.append(operation)
         for op in interested_ops:
             assert isinstance(op, Operation)
             min = op.attributes.get('min', - 2 << 30)
@@ -242,14 +261,15 @@ class GraphFormatter(GraphCommandProcesser):
                 operation.attributes['gather_index'] = operation.attributes['indices']
                 operation.attributes.pop('indices')
 
-    def format_cast(self) -> None:
+    def format_cast(self, interested_ops: List[Operation] = None) -> None:
         """
             cast op 的参数 to 默认为 int，使用该函数将其封装为 ppq.core.DataType
         """
-        interested_ops = []
-        for _, operation in self.graph.operations.items():
-            assert isinstance(operation, Operation)
-            if operation.type == 'Cast': interested_ops.append(operation)
+        if interested_ops is None:
+            interested_ops = []
+            for _, operation in self.graph.operations.items():
+                assert isinstance(operation, Operation)
+                if operation.type == 'Cast': interested_ops.append(operation)
         for operation in interested_ops:
             assert isinstance(operation, Operation)
             assert 'to' in operation.attributes
@@ -457,30 +477,45 @@ class GraphMerger(GraphCommandProcesser):
             beta  = bn_op.parameters[1].value
             mean  = bn_op.parameters[2].value
             var   = bn_op.parameters[3].value
-            epsilon = bn_op.attributes.get('epislon', 1e-5)
+            epsilon = bn_op.attributes.get('epsilon', 1e-5)
 
             if computing_op.num_of_parameters == 1:
                 w = computing_op.parameters[0].value  # no bias.
+                # bias has the same size as output channel, which is not always w.shape[0](ConvTranspose, Gemm).
+                num_of_channel = alpha.shape[0]
                 if isinstance(w, torch.Tensor):
-                    b = torch.zeros(size=w.shape[0], dtype=torch.float, device=w.device)
+                    b = torch.zeros(size=(num_of_channel, ), dtype=torch.float, device=w.device)
                 if isinstance(w, np.ndarray):
-                    b = np.zeros(shape=w.shape[0], dtype=np.float32)
+                    b = np.zeros(shape=num_of_channel, dtype=np.float32)
             else:
                 w, b = [var.value for var in computing_op.parameters[: 2]]  # has bias.
 
+            # bn(x) = scale * (x - mean) + beta, scale is applied along output channel of computing op.
+            scale = alpha / np.sqrt(var + epsilon)
             if computing_op.type == 'Conv':
 
-                # calculate new weight and bias
-                scale = alpha / np.sqrt(var + epsilon)
-                w = w * scale.reshape([-1, 1, 1, 1])
-                b = alpha * (b - mean) / np.sqrt(var + epsilon) + beta
+                # weight layout: [out_channel, in_channel / group, kernel_size, kernel_size]
+                w = w * scale.reshape([-1] + [1] * (w.ndim - 1))
+                b = scale * (b - mean) + beta
+
+            elif computing_op.type == 'ConvTranspose':
+
+                # weight layout: [in_channel, out_channel / group, kernel_size, kernel_size]
+                group = computing_op.attributes.get('group', 1)
+                shape = w.shape
+                w = w.reshape([group, shape[0] // group, shape[1]] + list(shape[2: ]))
+                w = w * scale.reshape([group, 1, shape[1]] + [1] * (len(shape) - 2))
+                w = w.reshape(shape)
+                b = scale * (b - mean) + beta
 
             elif computing_op.type == 'Gemm':
 
-                # calculate new weight and bias
-                scale = alpha / np.sqrt(var + epsilon)
-                w = w * scale.reshape([-1, 1])
-                b = alpha * (b - mean) / np.sqrt(var + epsilon) + beta
+                # weight layout: [out_dim, in_dim] if transB else [in_dim, out_dim]
+                if computing_op.attributes.get('transB', 0): w = w * scale.reshape([-1, 1])
+                else: w = w * scale.reshape([1, -1])
+                # gemm(x) = gemm_alpha * x @ w + gemm_beta * b, gemm_alpha is kept as an attribute,
+                # gemm_beta is folded into bias and reset to 1 with merged op below.
+                b = scale * (computing_op.attributes.get('beta', 1.0) * b - mean) + beta
 
             else:
                 raise TypeError(
@@ -490,6 +525,7 @@ class GraphMerger(GraphCommandProcesser):
             # create new op and variable
             merged_op  = Operation(computing_op.name, op_type=computing_op.type,
                                    attributes=computing_op.attributes.copy())
+            if merged_op.type == 'Gemm': merged_op.attributes['beta'] = 1.0
             weight_var = Variable(computing_op.name + '_weight', w, True, [merged_op])
             bias_var   = Variable(computing_op.name + '_bias', b, True, [merged_op])
 
@@ -63,6 +63,11 @@ class GraphCommandProcesser(Callable, metaclass=ABCMeta):
             graph_or_processor (BaseGraph, Callable): 被处理的图对象，可以是 BaseGraph 或者 GraphCommandProcesser
                 如果是 GraphCommandProcesser 对象，则自动将 self 与 graph 链接成链
                 the graph being executed or previous GraphCommandProcesser in the chain
+
+            注意 GraphCommandProcesser 不会复制计算图，责任链上的所有处理器共享同一个 graph 对象，
+                所有指令都直接在原图上修改。
+            ATTENTION: GraphCommandProcesser never copies the graph, all processers in the chain share
+                the same graph object, and commands modify it in place.
         """
         if isinstance(graph_or_processor, GraphCommandProcesser):
             self._next_command_processer   = graph_or_processor
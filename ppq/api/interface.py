@@ -1,12 +1,17 @@
+import io
 import os
-from typing import Any, Callable, List
+import stat
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, BinaryIO, Callable, Iterable, List, Union
 
 import torch
-from ppq.core import (NetworkFramework, TargetPlatform, empty_ppq_cache,
-                      ppq_warning)
+from ppq.core import (ONNX_EXPORT_OPSET, NetworkFramework, TargetPlatform,
+                      empty_ppq_cache, ppq_warning)
 from ppq.executor import TorchExecutor
 from ppq.IR import (BaseGraph, GraphCommand, GraphCommandType, GraphFormatter,
-                    GraphMerger)
+                    GraphMerger, RunnableGraph)
+from ppq.IR.base.command import GraphDeployCommand
 from ppq.IR.morph import GraphDeviceSwitcher
 from ppq.parser import *
 from ppq.quantization.quantizer import (ACADEMIC_INT4_Quantizer,
@@ -27,6 +32,11 @@ from torch.utils.data import DataLoader
 
 from .setting import *
 
+# orjson 是可选依赖，安装后将用于加速配置文件的读取
+# orjson is an optional dependency, it is used to speed up setting file parsing if installed.
+try: import orjson
+except ImportError: orjson = None
+
 QUANTIZER_COLLECTION = {
     TargetPlatform.PPL_DSP_INT8: PPL_DSP_Quantizer,
     TargetPlatform.PPL_DSP_TI_IN8: PPL_DSP_TI_Quantizer,
@@ -87,10 +97,165 @@ EXPORTING_POSTFIX = {
     TargetPlatform.METAX_INT8_T:  '.onnx',
 }
 
+# 输出尺寸或执行流程依赖于输入数值的算子，对这些算子使用未初始化的输入进行 tracing 将得到不确定的结果
+# operations whose output shape (or control flow) depends on input values,
+# tracing them with an uninitialized input gives nondeterministic meta data.
+_VALUE_SENSITIVE_OPS = {'NonZero', 'Range', 'Unique', 'If', 'Loop', 'Compress', 'NonMaxSuppression'}
+
+# 菜鸡版量化配置中与平台相关的选项，see also UnbelievableUserFriendlyQuantizationSetting
+# platform related options of UnbelievableUserFriendlyQuantizationSetting
+_FUSE_CONV_ADD_PLATFORMS = frozenset({TargetPlatform.PPL_CUDA_INT4, TargetPlatform.PPL_CUDA_INT8})
+_ALIGN_OVERLAP_PLATFORMS = frozenset({TargetPlatform.METAX_INT8_C, TargetPlatform.METAX_INT8_T})
+
+def _create_dummy_input(
+    graph: BaseGraph, input_shape: List[int], 
+    input_dtype: torch.dtype, device: str) -> torch.Tensor:
+    # dummy input is used only for meta tracing, skip memset if its value does not matter.
+    # integer inputs are usually indices (token ids etc.), zero is the only value always valid for them.
+    if (not input_dtype.is_floating_point or 
+        any(op.type in _VALUE_SENSITIVE_OPS for op in graph.operations.values())):
+        return torch.zeros(size=input_shape, device=device, dtype=input_dtype)
+    return torch.empty(size=input_shape, device=device, dtype=input_dtype)
+
+def _resolve_dispatcher(dispatcher: str) -> type:
+    # dispatcher name is case insensitive, see also QuantizationSetting.dispatcher
+    # not cached, DISPATCHER_TABLE may be updated with user defined dispatchers at any time.
+    key = dispatcher.lower()
+    if key not in DISPATCHER_TABLE:
+        raise ValueError(f'Can not found dispatcher type "{dispatcher}", check your input again.')
+    return DISPATCHER_TABLE[key]
+
+@ lru_cache(maxsize=None)
+def _make_collate(device: str) -> Callable:
+    # collate function used by quantize(), moves a batch to executing device.
+    # batch already on that device is returned directly, only host to device copy is asynchronous,
+    # a non-blocking device to host copy may return before its data is ready.
+    device = torch.device(device)
+    def _collate(batch: torch.Tensor) -> torch.Tensor:
+        # torch.device('cuda') != torch.device('cuda:0'), fill in current device index before comparing.
+        # it is resolved per call, so that torch.cuda.set_device is respected.
+        target = device
+        if target.type == 'cuda' and target.index is None:
+            target = torch.device('cuda', torch.cuda.current_device())
+        if batch.device == target: return batch
+        return batch.to(target, non_blocking=(target.type == 'cuda'))
+    return _collate
+
+@ lru_cache(maxsize=32)
+def _make_dispatch_pipeline(quantizer_cls: type, dispatcher_cls: type) -> Callable:
+    # dispatcher instance and default quant types only depend on (quantizer_cls, dispatcher_cls),
+    # create them once and reuse the closure, see also dispatch_graph.
+    # cache is keyed by resolved dispatcher class, re-registering a dispatcher name creates a new pipeline.
+    dispatcher = dispatcher_cls()
+    assert isinstance(dispatcher, GraphDispatcher)
+    default_quant_types = frozenset(quantizer_cls.static_quant_operation_types())
+
+    def _dispatch(graph: BaseGraph, quant_types: set = None) -> DispatchingTable:
+        return dispatcher.dispatch(
+            graph=graph, quant_types=default_quant_types if quant_types is None else quant_types, 
+            quant_platform=TargetPlatform.UNSPECIFIED, # MUST BE UNSPECIFIED, 这里的意思是交由 Quantizer 决定是否量化这个算子
+            fp32_platform=TargetPlatform.FP32,         
+            SOI_platform=TargetPlatform.SHAPE_OR_INDEX)
+    return _dispatch
+
+class _PinnedAsyncLoader:
+    """
+        包装校准数据集，将位于 cpu 上的数据通过锁页内存异步拷贝到执行设备上，
+        使 host to device 拷贝与上一个 batch 的前向运算重叠。
+        wrap calibration dataloader, cpu tensors are copied to executing device asynchronously via pinned memory,
+        so that host to device copy overlaps with forward of previous batch.
+        
+        ATTENTION: 校准过程将多次遍历数据集并调用 len(dataloader)，这个类保留了这两种行为
+        calibration passes iterate dataloader for multiple times and call len(dataloader), both are kept here.
+    """
+    def __init__(self, dataloader: Iterable, device: str) -> None:
+        self._dataloader = dataloader
+        self._device = torch.device(device)
+
+    def _transfer(self, data: Any) -> Any:
+        if isinstance(data, torch.Tensor):
+            if data.device.type != 'cpu': return data
+            return data.pin_memory().to(self._device, non_blocking=True)
+        if isinstance(data, (list, tuple)): return type(data)(self._transfer(item) for item in data)
+        if isinstance(data, dict): return {key: self._transfer(value) for key, value in data.items()}
+        return data
+
+    def __iter__(self):
+        for data in self._dataloader: yield self._transfer(data)
+
+    def __len__(self) -> int:
+        return len(self._dataloader)
+
+class _PrefetchedLoader:
+    """
+        在创建时即开始遍历数据集(DataLoader 在此时创建工作进程)，调用 prefetch 缓存最初的若干 batch，
+            使 DataLoader 工作进程的启动与其他工作重叠。
+        第一次遍历时先给出缓存的 batch，再接着同一个迭代器继续，此后的遍历与原数据集完全一致。
+        start iterating dataloader at creation (DataLoader forks its workers here), 
+            call prefetch to buffer the first few batches, so that startup of DataLoader workers overlaps with other work.
+        The first iteration yields buffered batches and then continues with the same iterator,
+            later iterations behave exactly like the wrapped dataloader.
+
+        ATTENTION: 工作进程由 fork 创建，请在启动其他线程之前创建这个对象
+            workers are forked, create this object before starting any other thread.
+    """
+    def __init__(self, dataloader: Iterable) -> None:
+        self._dataloader = dataloader
+        self._iterator   = iter(dataloader)
+        self._prefetched = []
+
+    def prefetch(self, num_of_prefetch: int = 2):
+        if self._iterator is None: return
+        for _ in range(num_of_prefetch):
+            try: self._prefetched.append(next(self._iterator))
+            except StopIteration: break
+
+    def __iter__(self):
+        if self._iterator is None:
+            yield from self._dataloader
+            return
+        iterator, prefetched = self._iterator, self._prefetched
+        self._iterator, self._prefetched = None, []
+        yield from prefetched
+        yield from iterator
+
+    def __len__(self) -> int:
+        return len(self._dataloader)
+
+def _ensure_pinned_async(dataloader: Iterable, device: str, collate_fn: Callable) -> Iterable:
+    # collate_fn is written against raw data, moving data before it changes what it receives.
+    if dataloader is None or collate_fn is not None: return dataloader
+    if not torch.cuda.is_available() or not str(device).startswith('cuda'): return dataloader
+    if isinstance(dataloader, _PinnedAsyncLoader): return dataloader
+    return _PinnedAsyncLoader(dataloader=dataloader, device=device)
+
+def create_calibration_dataloader(
+    dataset: Any, batchsize: int = 1, 
+    num_workers: int = 2, shuffle: bool = False, **kwargs) -> DataLoader:
+    """
+        创建一个适合 ppq 校准使用的 DataLoader，数据将被放置在锁页内存中，且工作进程在多次遍历之间被保留
+        create a DataLoader for ppq calibration, batches are placed in pinned memory, 
+            and workers are kept alive across epochs as calibration iterates dataloader for multiple times.
+
+    Args:
+        dataset (Any): 校准数据集 calibration dataset
+        batchsize (int, optional): batchsize. Defaults to 1.
+        num_workers (int, optional): 数据加载进程数 number of loading workers. Defaults to 2.
+        shuffle (bool, optional): 是否打乱数据 whether to shuffle data. Defaults to False.
+
+    Returns:
+        DataLoader: 校准数据集 calibration dataloader
+    """
+    return DataLoader(
+        dataset=dataset, batch_size=batchsize, shuffle=shuffle, 
+        num_workers=num_workers, pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0, **kwargs)
+
 def load_graph(file_path: str, from_framework: NetworkFramework=NetworkFramework.ONNX, **kwargs) -> BaseGraph:
-    if from_framework not in PARSERS:
+    parser_cls = PARSERS.get(from_framework)
+    if parser_cls is None:
         raise KeyError(f'Requiring framework {from_framework} does not support parsing now.')
-    parser = PARSERS[from_framework]()
+    parser = parser_cls()
     assert isinstance(parser, GraphBuilder), 'Unexpected Parser found.'
     if from_framework == NetworkFramework.CAFFE:
         assert 'caffemodel_path' in kwargs, ('parameter "caffemodel_path" is required here for loading caffe model from file, '
@@ -129,18 +294,20 @@ def load_caffe_graph(prototxt_path: str, caffemodel_path: str) -> BaseGraph:
 
 def dump_torch_to_onnx(
     model: torch.nn.Module, 
-    onnx_export_file: str, 
+    onnx_export_file: Union[str, BinaryIO], 
     input_shape: List[int], 
     input_dtype: torch.dtype, 
     inputs: List[Any] = None,
-    device: str = 'cuda'):
+    device: str = 'cuda',
+    opset_version: int = ONNX_EXPORT_OPSET):
     """
         转换一个 torch 模型到 onnx，并保存到指定位置
         convert a torch model to onnx and save to the specified location
     Args:
         model (torch.nn.Module): 被转换的 torch 模型 torch model used for conversion
 
-        onnx_export_file (str): 保存文件的路径 the path to save onnx model
+        onnx_export_file (str): 保存文件的路径，也可以是一个内存中的二进制缓冲区
+                                the path to save onnx model, an in-memory binary buffer is also acceptable.
 
         input_shape (List[int]): 模型输入尺寸，用于执行 jit.trace，对于动态尺寸的模型，输入一个模型可接受的尺寸即可。
             如果模型存在多个输入，则需要使用 inputs 变量进行传参，此项设置为 None
@@ -156,6 +323,10 @@ def dump_torch_to_onnx(
                                     a list of arrays
 
         device (str, optional): 转换过程的执行设备 the execution device, defaults to 'cuda'.
+
+        opset_version (int, optional): 导出使用的 onnx opset，更高的 opset 可能导出 ppq 执行器尚不支持的算子。
+                                       onnx opset used for exporting, defaults to ppq.core.ONNX_EXPORT_OPSET(11).
+                                       higher opset might export operations that ppq executor does not support yet.
     """
 
     # set model to eval mode, stablize normalization weights.
@@ -168,8 +339,9 @@ def dump_torch_to_onnx(
     else: dummy_input = inputs
 
     torch.onnx.export(
-        model=model, args=dummy_input,
-        verbose=False, f=onnx_export_file, opset_version=11,
+        model=model, args=dummy_input, verbose=False, 
+        f=onnx_export_file, opset_version=opset_version,
+        do_constant_folding=True, export_params=True,
     )
 
 @ empty_ppq_cache
@@ -186,6 +358,7 @@ def quantize_onnx_model(
     device: str = 'cuda',
     verbose: int = 0,
     do_quantize: bool = True,
+    calibration_micro_batch: int = 1,
 ) -> BaseGraph:
     """
         量化一个 onnx 原生的模型
@@ -227,6 +400,18 @@ def quantize_onnx_model(
 
         verbose (int, optional): 是否打印详细信息 whether to print details, defaults to 0.
 
+        calibration_micro_batch (int, optional): 校准时将多少个 batch 拼接为一次前向执行，默认为 1(不拼接)。
+            PPQ 会先执行一次探测以确定每个激活值的 batch 维度，并将激活值沿该维度切分后再送入 observer；
+            若存在无法确定 batch 维度的激活值，PPQ 将给出警告并退回逐个 batch 执行。
+            仅当模型 batch 维度可变时才可开启此项，输入不是单个 Tensor 时不会拼接。
+                                number of calibration batches concatenated into one forward, defaults to 1.
+                                batch axis of each observed activation is found by a probing forward,
+                                activations are split along it into micro batches before being observed.
+                                if batch axis of any activation can not be determined, 
+                                PPQ warns and falls back to one forward per batch.
+                                enable it only if batch dimension of your network is dynamic,
+                                batches which are not a single tensor will not be concatenated.
+
     Raises:
         ValueError: 给定平台不可量化 the given platform doesn't support quantization
         KeyError: 给定平台不被支持 the given platform is not supported yet
@@ -235,40 +420,102 @@ def quantize_onnx_model(
         BaseGraph: 量化后的IR，包含了后端量化所需的全部信息 
                    The quantized IR, containing all information needed for backend execution
     """
+    ppq_ir = load_onnx_graph(onnx_import_file=onnx_import_file)
+    return _quantize_from_graph(
+        ppq_ir=ppq_ir, calib_dataloader=calib_dataloader, calib_steps=calib_steps, 
+        input_shape=input_shape, input_dtype=input_dtype, inputs=inputs, setting=setting, 
+        collate_fn=collate_fn, platform=platform, device=device, verbose=verbose, do_quantize=do_quantize, 
+        calibration_micro_batch=calibration_micro_batch)
+
+@ empty_ppq_cache
+def quantize_onnx_model_from_bytes(
+    onnx_bytes: bytes,
+    calib_dataloader: DataLoader,
+    calib_steps: int,
+    input_shape: List[int],
+    input_dtype: torch.dtype = torch.float,
+    inputs: List[Any] = None,
+    setting: QuantizationSetting = None,
+    collate_fn: Callable = None,
+    platform: TargetPlatform = TargetPlatform.PPL_DSP_INT8,
+    device: str = 'cuda',
+    verbose: int = 0,
+    do_quantize: bool = True,
+    calibration_micro_batch: int = 1,
+) -> BaseGraph:
+    """
+        量化一个内存中序列化的 onnx 模型，除模型来源外与 quantize_onnx_model 完全一致
+        quantize a serialized onnx model in memory, same as quantize_onnx_model except for model source.
+
+    Args:
+        onnx_bytes (bytes): 序列化的 onnx 模型 serialized onnx model
+
+        其余参数请参考 quantize_onnx_model
+        for other parameters, see also quantize_onnx_model
+
+    Returns:
+        BaseGraph: 量化后的IR，包含了后端量化所需的全部信息 
+                   The quantized IR, containing all information needed for backend execution
+    """
+    parser = PARSERS[NetworkFramework.ONNX]()
+    assert isinstance(parser, OnnxParser), 'Unexpected Parser found.'
+    ppq_ir = format_graph(graph=parser.build_from_bytes(onnx_bytes))
+    return _quantize_from_graph(
+        ppq_ir=ppq_ir, calib_dataloader=calib_dataloader, calib_steps=calib_steps, 
+        input_shape=input_shape, input_dtype=input_dtype, inputs=inputs, setting=setting, 
+        collate_fn=collate_fn, platform=platform, device=device, verbose=verbose, do_quantize=do_quantize, 
+        calibration_micro_batch=calibration_micro_batch)
+
+def _quantize_from_graph(
+    ppq_ir: BaseGraph, calib_dataloader: DataLoader, calib_steps: int,
+    input_shape: List[int], input_dtype: torch.dtype, inputs: List[Any],
+    setting: QuantizationSetting, collate_fn: Callable, platform: TargetPlatform,
+    device: str, verbose: int, do_quantize: bool, calibration_micro_batch: int = 1) -> BaseGraph:
+    # shared quantization procedure of quantize_onnx_model, quantize_caffe_model, etc.
+    # ppq_ir should have been formatted by format_graph.
     if not TargetPlatform.is_quantized_platform(platform=platform):
         raise ValueError(f'Target Platform {platform} is an non-quantable platform.')
-    if platform not in QUANTIZER_COLLECTION:
+    quantizer_cls = QUANTIZER_COLLECTION.get(platform)
+    if quantizer_cls is None:
         raise KeyError(f'Target Platform {platform} is not supported by ppq right now.')
     if do_quantize:
         if calib_dataloader is None or calib_steps is None:
             raise TypeError('Quantization needs a valid calib_dataloader and calib_steps setting.')
+        if not isinstance(calibration_micro_batch, int) or calibration_micro_batch < 1:
+            raise ValueError(f'calibration_micro_batch should be a positive integer, '
+                             f'however {calibration_micro_batch} was given.')
 
     if setting is None:
         setting = QuantizationSettingFactory.default_setting()
+    calib_dataloader = _ensure_pinned_async(calib_dataloader, device=device, collate_fn=collate_fn)
 
-    ppq_ir = load_onnx_graph(onnx_import_file=onnx_import_file)
-    ppq_ir = dispatch_graph(graph=ppq_ir, platform=platform, setting=setting)
+    quantizer = quantizer_cls(graph=ppq_ir)
+    assert isinstance(quantizer, BaseQuantizer)
+    ppq_ir = dispatch_graph(graph=ppq_ir, platform=platform, setting=setting, quantizer=quantizer)
 
     if inputs is None:
-        dummy_input = torch.zeros(size=input_shape, device=device, dtype=input_dtype)
+        dummy_input = _create_dummy_input(
+            graph=ppq_ir, input_shape=input_shape, input_dtype=input_dtype, device=device)
     else: dummy_input = inputs
 
-    quantizer = QUANTIZER_COLLECTION[platform](graph=ppq_ir)
-
-    assert isinstance(quantizer, BaseQuantizer)
-    executor = TorchExecutor(graph=quantizer._graph, device=device)
     if do_quantize:
+        # executor is only required by quantization, do not build it for dispatching only.
+        executor = TorchExecutor(graph=quantizer._graph, device=device)
         quantizer.quantize(
             inputs=dummy_input,
             calib_dataloader=calib_dataloader,
             executor=executor,
             setting=setting,
             calib_steps=calib_steps,
-            collate_fn=collate_fn
+            collate_fn=collate_fn,
+            calibration_micro_batch=calibration_micro_batch
         )
         if verbose: quantizer.report()
         return quantizer._graph
     else:
+        # creating an executor used to deploy graph parameters to device as torch tensors,
+        # keep this behaviour without building the executor.
+        RunnableGraph(quantizer._graph)(GraphDeployCommand(device=device))
         return quantizer._graph
 
 @ empty_ppq_cache
@@ -286,6 +533,7 @@ def quantize_torch_model(
     onnx_export_file: str = 'onnx.model',
     device: str = 'cuda',
     verbose: int = 0,
+    calibration_micro_batch: int = 1,
     ) -> BaseGraph:
     """
         量化一个 Pytorch 原生的模型
@@ -321,11 +569,26 @@ def quantize_torch_model(
         do_quantize (Bool, optional): 是否执行量化 whether to quantize the model, defaults to True, defaults to True.
 
         platform (TargetPlatform, optional): 量化的目标平台 target backend platform, defaults to TargetPlatform.DSP_INT8.
+
+        onnx_export_file (str, optional): 导出的 onnx 模型保存位置，设置为 None 时不写入磁盘
+                                          where to save the exported onnx model, set None to skip writing file.
                                         
         device (str, optional): 量化过程的执行设备 execution device, defaults to 'cuda'.
 
         verbose (int, optional): 是否打印详细信息 whether to print details, defaults to 0.
 
+        calibration_micro_batch (int, optional): 校准时将多少个 batch 拼接为一次前向执行，默认为 1(不拼接)。
+            PPQ 会先执行一次探测以确定每个激活值的 batch 维度，并将激活值沿该维度切分后再送入 observer；
+            若存在无法确定 batch 维度的激活值，PPQ 将给出警告并退回逐个 batch 执行。
+            仅当模型 batch 维度可变时才可开启此项，输入不是单个 Tensor 时不会拼接。
+                                number of calibration batches concatenated into one forward, defaults to 1.
+                                batch axis of each observed activation is found by a probing forward,
+                                activations are split along it into micro batches before being observed.
+                                if batch axis of any activation can not be determined, 
+                                PPQ warns and falls back to one forward per batch.
+                                enable it only if batch dimension of your network is dynamic,
+                                batches which are not a single tensor will not be concatenated.
+
     Raises:
         ValueError: 给定平台不可量化 the given platform doesn't support quantization
         KeyError: 给定平台不被支持 the given platform is not supported yet
@@ -334,15 +597,34 @@ def quantize_torch_model(
         BaseGraph: 量化后的IR，包含了后端量化所需的全部信息 
                    The quantized IR, containing all information needed for backend execution
     """
-    # dump pytorch model to onnx
-    dump_torch_to_onnx(model=model, onnx_export_file=onnx_export_file, 
-        input_shape=input_shape, input_dtype=input_dtype, 
-        inputs=inputs, device=device)
+    # dump pytorch model to onnx, keep it in memory and parse from there.
+    # dataloader workers are forked first, forking a multi-threaded process may deadlock.
+    # exporting is then done in a background thread, meanwhile the first batches are prefetched.
+    # without dataloader workers there is nothing to overlap with, export is done inline.
+    buffer = io.BytesIO()
+    if (do_quantize and isinstance(calib_dataloader, DataLoader) and 
+        calib_dataloader.num_workers > 0):
+        calib_dataloader = _PrefetchedLoader(calib_dataloader)
+    if isinstance(calib_dataloader, _PrefetchedLoader):
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            exporting = pool.submit(dump_torch_to_onnx, model=model, onnx_export_file=buffer, 
+                input_shape=input_shape, input_dtype=input_dtype, inputs=inputs, device=device)
+            calib_dataloader.prefetch()
+            exporting.result()
+    else:
+        dump_torch_to_onnx(model=model, onnx_export_file=buffer, 
+            input_shape=input_shape, input_dtype=input_dtype, inputs=inputs, device=device)
+    onnx_bytes = buffer.getvalue()
+
+    # onnx model is still saved to onnx_export_file for inspection, set it to None to skip disk io.
+    if onnx_export_file is not None:
+        with open(onnx_export_file, 'wb') as file: file.write(onnx_bytes)
 
-    return quantize_onnx_model(onnx_import_file=onnx_export_file, 
+    return quantize_onnx_model_from_bytes(onnx_bytes=onnx_bytes, 
         calib_dataloader=calib_dataloader, calib_steps=calib_steps, collate_fn=collate_fn, 
         input_shape=input_shape, input_dtype=input_dtype, inputs=inputs, setting=setting, 
-        platform=platform, device=device, verbose=verbose, do_quantize=do_quantize)
+        platform=platform, device=device, verbose=verbose, do_quantize=do_quantize, 
+        calibration_micro_batch=calibration_micro_batch)
 
 @ empty_ppq_cache
 def quantize_caffe_model(
@@ -359,6 +641,7 @@ def quantize_caffe_model(
     platform: TargetPlatform = TargetPlatform.PPL_DSP_INT8,
     device: str = 'cuda',
     verbose: int = 0,
+    calibration_micro_batch: int = 1,
 ) -> BaseGraph:
     """
         量化一个 caffe 原生的模型
@@ -402,6 +685,18 @@ def quantize_caffe_model(
 
         verbose (int, optional): 是否打印详细信息 whether to print details, defaults to 0.
 
+        calibration_micro_batch (int, optional): 校准时将多少个 batch 拼接为一次前向执行，默认为 1(不拼接)。
+            PPQ 会先执行一次探测以确定每个激活值的 batch 维度，并将激活值沿该维度切分后再送入 observer；
+            若存在无法确定 batch 维度的激活值，PPQ 将给出警告并退回逐个 batch 执行。
+            仅当模型 batch 维度可变时才可开启此项，输入不是单个 Tensor 时不会拼接。
+                                number of calibration batches concatenated into one forward, defaults to 1.
+                                batch axis of each observed activation is found by a probing forward,
+                                activations are split along it into micro batches before being observed.
+                                if batch axis of any activation can not be determined, 
+                                PPQ warns and falls back to one forward per batch.
+                                enable it only if batch dimension of your network is dynamic,
+                                batches which are not a single tensor will not be concatenated.
+
     Raises:
         ValueError: 给定平台不可量化 the given platform doesn't support quantization
         KeyError: 给定平台不被支持 the given platform is not supported yet
@@ -410,45 +705,12 @@ def quantize_caffe_model(
         BaseGraph: 量化后的IR，包含了后端量化所需的全部信息 
                    The quantized IR, containing all information needed for backend execution
     """
-    if not TargetPlatform.is_quantized_platform(platform=platform):
-        raise ValueError(f'Target Platform {platform} is an non-quantable platform.')
-    if platform not in QUANTIZER_COLLECTION:
-        raise KeyError(f'Target Platform {platform} is not supported by ppq right now.')
-    if do_quantize:
-        if calib_dataloader is None or calib_steps is None:
-            raise TypeError('Quantization needs a valid calib_dataloader and calib_steps setting.')
-    
-    if setting is None:
-        setting = QuantizationSettingFactory.default_setting()
-
-    ppq_ir = load_graph(file_path=caffe_proto_file, 
-                        caffemodel_path=caffe_model_file, 
-                        from_framework=NetworkFramework.CAFFE)
-    
-    ppq_ir = format_graph(ppq_ir)
-    ppq_ir = dispatch_graph(ppq_ir, platform, setting)
-
-    if inputs is None:
-        dummy_input = torch.zeros(size=input_shape, device=device, dtype=input_dtype)
-    else: dummy_input = inputs
-
-    quantizer = QUANTIZER_COLLECTION[platform](graph=ppq_ir)
-
-    assert isinstance(quantizer, BaseQuantizer)
-    executor = TorchExecutor(graph=quantizer._graph, device=device)
-    if do_quantize:
-        quantizer.quantize(
-            inputs=dummy_input,
-            calib_dataloader=calib_dataloader,
-            executor=executor,
-            setting=setting,
-            calib_steps=calib_steps,
-            collate_fn=collate_fn
-        )
-        if verbose: quantizer.report()
-        return quantizer._graph
-    else:
-        return quantizer._graph
+    ppq_ir = load_caffe_graph(prototxt_path=caffe_proto_file, caffemodel_path=caffe_model_file)
+    return _quantize_from_graph(
+        ppq_ir=ppq_ir, calib_dataloader=calib_dataloader, calib_steps=calib_steps, 
+        input_shape=input_shape, input_dtype=input_dtype, inputs=inputs, setting=setting, 
+        collate_fn=collate_fn, platform=platform, device=device, verbose=verbose, do_quantize=do_quantize, 
+        calibration_micro_batch=calibration_micro_batch)
 
 
 def export_ppq_graph(
@@ -472,8 +734,9 @@ def export_ppq_graph(
         platform (TargetPlatform): 期望部署的目标平台
                            target backend platform
 
-        graph_save_to (str): 模型保存文件名，不要写后缀名，ppq 会自己加后缀
+        graph_save_to (str): 模型保存文件名，不要写后缀名，ppq 会自己加后缀(已有后缀时不会重复添加)
                            filename to save, do not add postfix to this
+                           (postfix will not be appended twice if it is already there)
 
         config_save_to (str): 量化配置信息保存文件名。
             注意部分平台导出时会将量化配置信息直接写入模型，在这种情况下设置此参数无效
@@ -481,23 +744,24 @@ def export_ppq_graph(
             directly into the model file, this parameter won't have effect at
             this situation
     """
-    postfix = ''
-    if platform in EXPORTING_POSTFIX:
-        postfix = EXPORTING_POSTFIX[platform]
-    graph_save_to += postfix
+    postfix = EXPORTING_POSTFIX.get(platform, '')
+    # do not append postfix twice if user has already written it.
+    if not graph_save_to.endswith(postfix): graph_save_to += postfix
 
     for save_path in [graph_save_to, config_save_to]:
         if save_path is None: continue
-        if os.path.exists(save_path):
-            if os.path.isfile(save_path):
-                ppq_warning(f'File {save_path} has already exist, ppq exporter will overwrite it.')
-            if os.path.isdir(save_path):
-                raise FileExistsError(f'File {save_path} has already exist, and it is a directory, '
-                                    'ppq exporter can not create file here.')
-
-    if platform not in EXPORTERS:
+        try: file_stat = os.stat(save_path)
+        except FileNotFoundError: continue
+        if stat.S_ISDIR(file_stat.st_mode):
+            raise FileExistsError(f'File {save_path} has already exist, and it is a directory, '
+                                'ppq exporter can not create file here.')
+        if stat.S_ISREG(file_stat.st_mode):
+            ppq_warning(f'File {save_path} has already exist, ppq exporter will overwrite it.')
+
+    exporter_cls = EXPORTERS.get(platform)
+    if exporter_cls is None:
         raise KeyError(f'Requiring framework {platform} does not support export now.')
-    exporter = EXPORTERS[platform]()
+    exporter = exporter_cls()
     assert isinstance(exporter, GraphExporter), 'Unexpected Exporter found.'
     exporter.export(file_path=graph_save_to, config_path=config_save_to, graph=graph, **kwargs)
 
@@ -531,15 +795,14 @@ def format_graph(graph: BaseGraph) -> BaseGraph:
     formatter(GraphCommand(GraphCommandType.FORMAT_CONSTANT_INPUT))
     formatter(GraphCommand(GraphCommandType.FUSE_BN))
     formatter(GraphCommand(GraphCommandType.FORMAT_PARAMETERS))
-    formatter(GraphCommand(GraphCommandType.FORMAT_CAST))
-    formatter(GraphCommand(GraphCommandType.FORMAT_SLICE))
-    formatter(GraphCommand(GraphCommandType.FORMAT_CLIP))
+    formatter(GraphCommand(GraphCommandType.FORMAT_CAST_SLICE_CLIP))
     formatter(GraphCommand(GraphCommandType.DELETE_ISOLATED))
 
     return graph
 
 
-def dispatch_graph(graph: BaseGraph, platform: TargetPlatform, setting: QuantizationSetting) -> DispatchingTable:
+def dispatch_graph(graph: BaseGraph, platform: TargetPlatform, setting: QuantizationSetting,
+                   quantizer: BaseQuantizer = None) -> DispatchingTable:
     """
     
     这个函数执行图切分与调度，你的计算图将被切分成一系列子图，并被调度到不同设备上。
@@ -553,33 +816,32 @@ def dispatch_graph(graph: BaseGraph, platform: TargetPlatform, setting: Quantiza
     A dispatching table can be passed via QuantizationSetting to override 
         the default dispatching logic of ppq dispatcher manually.
 
+    如果你已经为这张图创建了 quantizer，可以将其传入，调度器将直接使用它的 quant_operation_types
+    If a quantizer has been created with this graph already, pass it here to reuse its quant_operation_types.
+
     """
-    assert platform in QUANTIZER_COLLECTION, (
+    quantizer_cls = QUANTIZER_COLLECTION.get(platform)
+    assert quantizer_cls is not None, (
         f'Platform misunderstood, except one of following platform {QUANTIZER_COLLECTION.keys()}')
-    quantizer = QUANTIZER_COLLECTION[platform](graph) # 初始化一个 quantizer 没有很大代价...
-    
-    if str(setting.dispatcher).lower() not in DISPATCHER_TABLE:
-        raise ValueError(f'Can not found dispatcher type "{setting.dispatcher}", check your input again.')
-    dispatcher = DISPATCHER_TABLE[str(setting.dispatcher).lower()]()
-    assert isinstance(dispatcher, GraphDispatcher)
-    assert isinstance(quantizer, BaseQuantizer)
-    quant_types = quantizer.quant_operation_types
 
-    dispatching_table = dispatcher.dispatch(
-        graph=graph, quant_types=quant_types, 
-        quant_platform=TargetPlatform.UNSPECIFIED, # MUST BE UNSPECIFIED, 这里的意思是交由 Quantizer 决定是否量化这个算子
-        fp32_platform=TargetPlatform.FP32,         
-        SOI_platform=TargetPlatform.SHAPE_OR_INDEX)
+    quant_types = None
+    if quantizer is not None:
+        assert isinstance(quantizer, BaseQuantizer)
+        quant_types = quantizer.quant_operation_types
+
+    dispatching_table = _make_dispatch_pipeline(quantizer_cls, _resolve_dispatcher(str(setting.dispatcher)))(
+        graph=graph, quant_types=quant_types)
 
     # override dispatching result with setting
-    dispatching_override = setting.dispatching_table
-    for opname, platform in dispatching_override.dispatchings.items():
-        if opname not in graph.operations: continue
-        assert isinstance(platform, int), (
+    # operations that can not be found in graph are ignored, intersect keys first.
+    dispatching_override = setting.dispatching_table.dispatchings
+    for opname in dispatching_override.keys() & graph.operations.keys():
+        override_platform = dispatching_override[opname]
+        assert isinstance(override_platform, int), (
             f'Your dispatching table contains a invalid setting of operation {opname}, '
             'All platform setting given in dispatching table is expected given as int, '
-            f'however {type(platform)} was given.')
-        dispatching_table[opname] = TargetPlatform(platform)
+            f'however {type(override_platform)} was given.')
+        dispatching_table[opname] = TargetPlatform(override_platform)
     
     for operation in graph.operations.values():
         assert operation.name in dispatching_table, (
@@ -587,8 +849,10 @@ def dispatch_graph(graph: BaseGraph, platform: TargetPlatform, setting: Quantiza
         operation.platform = dispatching_table[operation.name]
     
     # insert necessary device switchers.
-    formatter = GraphDeviceSwitcher(graph)
-    formatter(GraphCommand(GraphCommandType.INSERT_SWITCHER))
+    # switchers are only inserted around SOI operations, skip the pass if there is none.
+    if TargetPlatform.SHAPE_OR_INDEX in set(dispatching_table.values()):
+        formatter = GraphDeviceSwitcher(graph)
+        formatter(GraphCommand(GraphCommandType.INSERT_SWITCHER))
     return graph
     
 
@@ -598,6 +862,9 @@ class UnbelievableUserFriendlyQuantizationSetting:
 
     这个文件包含了最基本的量化配置。
     """
+    # to_json, from_file and __str__ all iterate over __slots__, keep it in sync with __init__.
+    __slots__ = ('equalization', 'finetune_steps', 'finetune_lr', 'calibration', 
+                 'platform', 'non_quantable_op', 'interested_outputs')
     
     def __init__(self, platform: TargetPlatform, finetune_steps: int = 5000, finetune_lr: float = 3e-4,
                  interested_outputs: List[str] = None, calibration: str = 'percentile', equalization: bool = True,
@@ -625,20 +892,26 @@ class UnbelievableUserFriendlyQuantizationSetting:
         self.non_quantable_op = non_quantable_op
         self.interested_outputs = interested_outputs
 
+        self._check_and_format()
+
+    def _check_and_format(self):
+        # 检查并规范化名字列表，__init__ 与 from_file 都需要调用此函数
+        # check and normalize name lists, called by both __init__ and from_file.
         if isinstance(self.non_quantable_op, str): self.non_quantable_op = [self.non_quantable_op]
         if isinstance(self.interested_outputs, str): self.interested_outputs = [self.interested_outputs]
+        if self.non_quantable_op is not None:
+            for op_name in self.non_quantable_op:
+                if not isinstance(op_name, str): raise TypeError(
+                    f'你尝试使用 non_quantable_op 来设定非量化算子，'
+                    f'non_quantable_op 只应当包含算子的名字，而你传入的数据中包括了 {type(op_name)}')
 
     def convert_to_daddy_setting(self) -> QuantizationSetting:
         # 将菜鸡版量化配置转换成高级版的
         daddy = QuantizationSettingFactory.default_setting()
         daddy.quantize_activation_setting.calib_algorithm = self.calibration
         
-        if self.platform in {TargetPlatform.PPL_CUDA_INT4, TargetPlatform.PPL_CUDA_INT8}:
-            daddy.fusion_setting.fuse_conv_add   = True
-        else: daddy.fusion_setting.fuse_conv_add = False
-
-        if self.platform in {TargetPlatform.METAX_INT8_C, TargetPlatform.METAX_INT8_T}:
-            daddy.fusion_setting.force_alignment_overlap = True
+        daddy.fusion_setting.fuse_conv_add = self.platform in _FUSE_CONV_ADD_PLATFORMS
+        daddy.fusion_setting.force_alignment_overlap = self.platform in _ALIGN_OVERLAP_PLATFORMS
 
         if self.finetune_steps > 0:
             daddy.advanced_optimization               = True
@@ -653,76 +926,107 @@ class UnbelievableUserFriendlyQuantizationSetting:
             daddy.equalization_setting.opt_level  = 1
             daddy.equalization_setting.value_threshold = 0
 
+        # names in non_quantable_op have been checked in _check_and_format.
         if self.non_quantable_op is not None:
+            fp32, dispatching_table = TargetPlatform.FP32, daddy.dispatching_table
             for op_name in self.non_quantable_op:
-                assert isinstance(op_name, str), (
-                    f'你尝试使用 non_quantable_op 来设定非量化算子，'
-                    f'non_quantable_op 只应当包含算子的名字，而你传入的数据中包括了 {type(op_name)}')
-                daddy.dispatching_table.append(op_name, TargetPlatform.FP32)
+                dispatching_table.append(op_name, fp32)
         
         return daddy
 
     def to_json(self, file_path: str) -> str:
-        if os.path.exists(file_path):
-            if os.path.isdir(file_path): 
+        try: file_stat = os.stat(file_path)
+        except FileNotFoundError: file_stat = None
+        if file_stat is not None:
+            if stat.S_ISDIR(file_stat.st_mode): 
                 raise FileExistsError(f'文件 {file_path} 已经存在且是一个目录，无法将配置文件写入到该位置！')
             ppq_warning(f'文件 {file_path} 已经存在并将被覆盖')
 
         # TargetPlatform is not a native type, convert it to string.
-        dump_dict = self.__dict__.copy()
+        # keys are dumped in declaration order, indent is kept since this file is supposed to be edited by hand.
+        dump_dict = {key: getattr(self, key) for key in self.__slots__}
         dump_dict['platform'] = self.platform.name
 
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump(obj=dump_dict, fp=file, sort_keys=True, indent=4, ensure_ascii=False)
+        # serialize to utf-8 bytes at once, then write them with a single call.
+        # always dumped with json, so that file format does not depend on whether orjson is installed.
+        content = json.dumps(obj=dump_dict, indent=4, ensure_ascii=False).encode('utf-8')
+        with open(file_path, 'wb') as file: file.write(content)
 
     @ staticmethod
     def from_file(file_path: str):
-        if not os.path.exists(file_path):
-            raise FileNotFoundError('找不到你的配置文件，检查配置文件路径是否正确！')
-        with open(file_path, 'r', encoding='utf-8') as file:
-            loaded = json.load(file)
+        try: file = open(file_path, 'rb')
+        except FileNotFoundError:
+            raise FileNotFoundError('找不到你的配置文件，检查配置文件路径是否正确！') from None
+        # both json.loads and orjson.loads decode utf-8 bytes directly.
+        with file: content = file.read()
+        loaded = orjson.loads(content) if orjson is not None else json.loads(content)
         assert isinstance(loaded, dict), 'Json文件无法解析，格式不正确'
         assert 'platform' in loaded, 'Json文件缺少必要项目 "platform"'
         
-        platform = loaded['platform']
-        if platform in TargetPlatform._member_names_:
-            platform = TargetPlatform._member_map_[platform]
-        else: raise KeyError('无法解析你的json配置文件，遇到了未知的platform属性。')
+        platform = TargetPlatform.__members__.get(loaded['platform'])
+        if platform is None: raise KeyError('无法解析你的json配置文件，遇到了未知的platform属性。')
         
         setting = UnbelievableUserFriendlyQuantizationSetting(platform)
-        for key, value in loaded.items():
-            if key == 'platform': continue
-            if key in setting.__dict__: setting.__dict__[key] = value
-            if key not in setting.__dict__: ppq_warning(f'你的Json文件中包含无法解析的属性 {key} ，该属性已经被舍弃')
+        # platform has been parsed above, all other known keys are merged at once.
+        known, parsed = set(UnbelievableUserFriendlyQuantizationSetting.__slots__), {'platform'}
+        unknown = loaded.keys() - known - parsed
+        if unknown: ppq_warning(f'你的Json文件中包含无法解析的属性 {sorted(unknown)} ，这些属性已经被舍弃')
+        for key in (loaded.keys() & known) - parsed: setattr(setting, key, loaded[key])
+        setting._check_and_format()
         assert isinstance(setting, UnbelievableUserFriendlyQuantizationSetting)
         return setting
 
     def __str__(self) -> str:
-        return str(self.__dict__)
+        return str({key: getattr(self, key) for key in self.__slots__})
+
+
+def _quantize_onnx_directory(working_directory: str, setting: QuantizationSetting, executing_device: str, 
+    input_shape: List[int], target_platform: TargetPlatform, dataloader: DataLoader, calib_steps: int) -> BaseGraph:
+    onnx_path = os.path.join(working_directory, 'model.onnx')
+    if not os.path.isfile(onnx_path):
+        raise FileNotFoundError(f'无法找到你的模型: {onnx_path},'
+                                '如果你使用caffe的模型, 请设置MODEL_TYPE为CAFFE')
+    return quantize_onnx_model(
+        onnx_import_file=onnx_path,
+        calib_dataloader=dataloader, calib_steps=calib_steps, input_shape=input_shape, setting=setting,
+        platform=target_platform, device=executing_device, collate_fn=_make_collate(executing_device)
+    )
+
+
+def _quantize_caffe_directory(working_directory: str, setting: QuantizationSetting, executing_device: str, 
+    input_shape: List[int], target_platform: TargetPlatform, dataloader: DataLoader, calib_steps: int) -> BaseGraph:
+    prototxt_path   = os.path.join(working_directory, 'model.prototxt')
+    caffemodel_path = os.path.join(working_directory, 'model.caffemodel')
+    if not os.path.isfile(caffemodel_path):
+        raise FileNotFoundError(f'无法找到你的模型: {caffemodel_path},'
+                                '如果你使用ONNX的模型, 请设置MODEL_TYPE为ONNX')
+    return quantize_caffe_model(
+        caffe_proto_file=prototxt_path,
+        caffe_model_file=caffemodel_path,
+        calib_dataloader=dataloader, calib_steps=calib_steps, input_shape=input_shape, setting=setting,
+        platform=target_platform, device=executing_device, collate_fn=_make_collate(executing_device)
+    )
+
+
+# quantize() 所支持的模型格式，每种格式从工作目录中读取对应的模型文件
+# model formats supported by quantize(), each of them loads its model files from working directory.
+QUANTIZE_HANDLERS = {
+    NetworkFramework.ONNX:  _quantize_onnx_directory,
+    NetworkFramework.CAFFE: _quantize_caffe_directory,
+}
 
 
 def quantize(working_directory: str, setting: QuantizationSetting, model_type: NetworkFramework,
              executing_device: str, input_shape: List[int], target_platform: TargetPlatform,
              dataloader: DataLoader, calib_steps: int = 32) -> BaseGraph:
-    if model_type == NetworkFramework.ONNX:
-        if not os.path.exists(os.path.join(working_directory, 'model.onnx')):
-            raise FileNotFoundError(f'无法找到你的模型: {os.path.join(working_directory, "model.onnx")},'
-                                    '如果你使用caffe的模型, 请设置MODEL_TYPE为CAFFE')
-        return quantize_onnx_model(
-            onnx_import_file=os.path.join(working_directory, 'model.onnx'),
-            calib_dataloader=dataloader, calib_steps=calib_steps, input_shape=input_shape, setting=setting,
-            platform=target_platform, device=executing_device, collate_fn=lambda x: x.to(executing_device)
-        )
-    if model_type == NetworkFramework.CAFFE:
-        if not os.path.exists(os.path.join(working_directory, 'model.caffemodel')):
-            raise FileNotFoundError(f'无法找到你的模型: {os.path.join(working_directory, "model.caffemodel")},'
-                                    '如果你使用ONNX的模型, 请设置MODEL_TYPE为ONNX')
-        return quantize_caffe_model(
-            caffe_proto_file=os.path.join(working_directory, 'model.prototxt'),
-            caffe_model_file=os.path.join(working_directory, 'model.caffemodel'),
-            calib_dataloader=dataloader, calib_steps=calib_steps, input_shape=input_shape, setting=setting,
-            platform=target_platform, device=executing_device, collate_fn=lambda x: x.to(executing_device)
-        )
+    handler = QUANTIZE_HANDLERS.get(model_type)
+    if handler is None:
+        raise ValueError(f'Model type {model_type} is not supported by quantize(), '
+                         f'expect one of {list(QUANTIZE_HANDLERS.keys())}')
+    return handler(
+        working_directory=working_directory, setting=setting, executing_device=executing_device, 
+        input_shape=input_shape, target_platform=target_platform, 
+        dataloader=dataloader, calib_steps=calib_steps)
 
 
 def export(working_directory: str, quantized: BaseGraph, platform: TargetPlatform, **kwargs):
@@ -736,6 +1040,7 @@ def export(working_directory: str, quantized: BaseGraph, platform: TargetPlatfor
 
 __all__ = ['load_graph', 'load_onnx_graph', 'load_caffe_graph',
            'dispatch_graph', 'dump_torch_to_onnx', 'quantize_onnx_model', 
+           'quantize_onnx_model_from_bytes', 'create_calibration_dataloader', 
            'quantize_torch_model', 'quantize_caffe_model', 
            'export_ppq_graph', 'format_graph', 'quantize', 'export', 
            'UnbelievableUserFriendlyQuantizationSetting']
@@ -93,10 +93,16 @@ class TargetPlatform(Enum):
     
     @ classmethod
     def is_quantized_platform(cls, platform) -> bool:
-        return platform in {
-            cls.PPL_DSP_INT8, cls.PPL_DSP_TI_IN8, cls.TRT_INT8, cls.NXP_INT8, cls.SNPE_INT8,
-            cls.PPL_CUDA_INT8, cls.PPL_CUDA_INT4, cls.EXTENSION, cls.PPL_CUDA_MIX, cls.ORT_OOS_INT8,
-            cls.ACADEMIC_INT4, cls.ACADEMIC_INT8, cls.ACADEMIC_MIX, cls.METAX_INT8_C, cls.METAX_INT8_T}
+        return platform in _QUANTIZED_PLATFORMS
+
+
+# members of an Enum can not be collected inside its own body, so this set is built right after it.
+_QUANTIZED_PLATFORMS = frozenset({
+    TargetPlatform.PPL_DSP_INT8, TargetPlatform.PPL_DSP_TI_IN8, TargetPlatform.TRT_INT8, 
+    TargetPlatform.NXP_INT8, TargetPlatform.SNPE_INT8, TargetPlatform.PPL_CUDA_INT8, 
+    TargetPlatform.PPL_CUDA_INT4, TargetPlatform.EXTENSION, TargetPlatform.PPL_CUDA_MIX, 
+    TargetPlatform.ORT_OOS_INT8, TargetPlatform.ACADEMIC_INT4, TargetPlatform.ACADEMIC_INT8, 
+    TargetPlatform.ACADEMIC_MIX, TargetPlatform.METAX_INT8_C, TargetPlatform.METAX_INT8_T})
 
 
 class RoundingPolicy(Enum):
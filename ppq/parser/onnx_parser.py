@@ -86,10 +86,19 @@ class OnnxParser(GraphBuilder):
         return results
 
     def build(self, file_path: str) -> BaseGraph:
-        _rand_seed = 0 # used for name generation.
         if not is_file_exist(file_path): 
             raise FileNotFoundError(f'file {file_path} does not exist, or it is a directory.')
-        model_pb = onnx.load(file_path)
+        return self.build_from_proto(onnx.load(file_path))
+
+    def build_from_bytes(self, onnx_bytes: bytes) -> BaseGraph:
+        """
+            从内存中的序列化模型构建计算图，不经过文件系统
+            build graph from a serialized onnx model in memory, without touching file system.
+        """
+        return self.build_from_proto(onnx.load_from_string(onnx_bytes))
+
+    def build_from_proto(self, model_pb: onnx.ModelProto) -> BaseGraph:
+        _rand_seed = 0 # used for name generation.
         opsets = model_pb.opset_import
 
         assert isinstance(model_pb, onnx.ModelProto), \
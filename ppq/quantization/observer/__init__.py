@@ -6,6 +6,8 @@ from ppq.core import (QuantizationStates, TensorQuantizationConfig,
 from ppq.executor import QuantOPRuntimeHook
 from ppq.IR import QuantableOperation, Variable
 
+import torch
+
 from .base import BaseTensorObserver
 from .range import (TorchHistObserver, TorchMinMaxObserver, TorchMSEObserver,
                     TorchPercentileObserver)
@@ -41,14 +43,36 @@ class CalibrationHook(QuantOPRuntimeHook):
     ) -> None:
         self._operation = operation
         self._observer_table = observer_table
+        # 以下属性用于将多个 batch 拼接为一次前向执行，see also RuntimeCalibrationPass.calibrate
+        # following attributes are used when micro batches are concatenated, see also RuntimeCalibrationPass.calibrate
+        # batch sizes of concatenated micro batches in current forward, None if batches are not concatenated.
+        self.micro_batch_sizes = None
+        # batch axis of each observed activation(variable name -> axis), parameters are not included.
+        self.batch_axes = {}
+        # if not None, activation shapes are recorded here(variable name -> shape) instead of being observed.
+        self.probed_shapes = None
         super().__init__(operation, operation_meta=operation.meta_data)
 
+    def _observe(self, observer: BaseTensorObserver, value: torch.Tensor):
+        # 拼接执行时，沿 batch 维度切分激活值并逐个送入 observer，使 percentile 等逐 batch 统计的结果保持不变
+        # split activation of concatenated micro batches along its batch axis, 
+        # so that observers collecting per batch statistics (percentile etc.) see exactly the same batches.
+        var = observer._watch_on
+        if self.probed_shapes is not None:
+            if not var.is_parameter: self.probed_shapes[var.name] = tuple(value.shape)
+            return
+        sizes = self.micro_batch_sizes
+        if sizes is not None and not var.is_parameter:
+            for micro_batch in torch.split(value, sizes, dim=self.batch_axes[var.name]): 
+                observer.observe(micro_batch)
+        else: observer.observe(value)
+
     def pre_forward_hook(
         self, inputs: list, quant_inputs: list, quant_configs: List[TensorQuantizationConfig]) -> list:
         for input_var, quant_config in zip(inputs, quant_configs):
             if quant_config in self._observer_table:
                 observer = self._observer_table[quant_config]
-                observer.observe(input_var)
+                self._observe(observer, input_var)
         return quant_inputs
 
     def post_forward_hook(
@@ -56,7 +80,7 @@ class CalibrationHook(QuantOPRuntimeHook):
         for output_var, quant_config in zip(outputs, quant_configs):
             if quant_config in self._observer_table:
                 observer = self._observer_table[quant_config]
-                observer.observe(output_var)
+                self._observe(observer, output_var)
         return quant_outputs
 
     def render_quantization_config(self):
@@ -17,6 +17,9 @@ from .base import BaseTensorObserver
 
 if USING_CUDA_KERNEL: from ppq.core import CUDA
 
+# torch.aminmax reads a tensor only once to get both min and max, it is available since torch 1.11
+_AMINMAX_AVAILABLE = hasattr(torch, 'aminmax')
+
 
 @ ppq_quant_param_computing_function
 def minmax_to_scale_offset(
@@ -57,8 +60,10 @@ class TorchMinMaxObserver(BaseTensorObserver):
         assert value.numel() > 0, (f'You are observing an empty tensor({self._watch_on.name}).')
         if self._quant_cfg.state == QuantizationStates.INITIAL:
             if self._quant_cfg.policy.has_property(QuantizationProperty.PER_TENSOR):
-                self._min_val_collector.append(value.min().reshape(shape=[1, ]))
-                self._max_val_collector.append(value.max().reshape(shape=[1, ]))
+                if _AMINMAX_AVAILABLE: min_val, max_val = torch.aminmax(value)
+                else: min_val, max_val = value.min(), value.max()
+                self._min_val_collector.append(min_val.reshape(shape=[1, ]))
+                self._max_val_collector.append(max_val.reshape(shape=[1, ]))
             elif self._quant_cfg.policy.has_property(QuantizationProperty.PER_CHANNEL):
                 assert isinstance(self._quant_cfg, ChannelwiseTensorQuantizationConfig), \
                     'Your quantization config has PER_CHANNEL while it is not a '\
@@ -66,8 +71,13 @@ class TorchMinMaxObserver(BaseTensorObserver):
                 channel_axis = self._quant_cfg.channel_axis
                 channelwise_view = value.transpose(dim0=0, dim1=channel_axis)
                 channelwise_view = torch.flatten(channelwise_view, start_dim=1)
-                self._min_val_collector.append(torch.min(channelwise_view, dim=1, keepdim=True)[0])
-                self._max_val_collector.append(torch.max(channelwise_view, dim=1, keepdim=True)[0])
+                if _AMINMAX_AVAILABLE: 
+                    min_val, max_val = torch.aminmax(channelwise_view, dim=1, keepdim=True)
+                else:
+                    min_val = torch.min(channelwise_view, dim=1, keepdim=True)[0]
+                    max_val = torch.max(channelwise_view, dim=1, keepdim=True)[0]
+                self._min_val_collector.append(min_val)
+                self._max_val_collector.append(max_val)
             else:
                 raise TypeError('Min-max Observer only work with per-tensor or per-channel quantize policy.')
 
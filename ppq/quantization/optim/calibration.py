@@ -3,7 +3,7 @@ from typing import Callable, Dict, Iterable, List
 
 from ppq.core import (ChannelwiseTensorQuantizationConfig, QuantizationStates,
                       QuantizationPolicy, QuantizationProperty,
-                      TensorQuantizationConfig, empty_ppq_cache)
+                      TensorQuantizationConfig, empty_ppq_cache, ppq_warning)
 from ppq.executor import BaseGraphExecutor, RuntimeHook
 from ppq.IR import GraphCommandProcesser, QuantableOperation
 from ppq.quantization.observer import (CalibrationHook, OperationObserver,
@@ -44,21 +44,96 @@ class RuntimeCalibrationPass(QuantizationOptimizationPass):
         self._observers = {}
         self._collate_fn = None
         self._calib_steps = None
+        self._micro_batch = 1
         self._override = override
 
+    def probe_batch_axes(self, executor: BaseGraphExecutor, micro_batches: List[torch.Tensor], 
+        hooks: Dict[str, CalibrationHook], output_names: List[str] = None) -> bool:
+        """
+            通过比较单个 batch 与拼接后 batch 的激活值尺寸，确定每一个被观测激活值的 batch 维度。
+            只有尺寸恰好从单个 batch 大小变为拼接后 batch 大小的那一个维度才被认为是 batch 维度，
+            如果存在无法确定 batch 维度的激活值，返回 False。
+            
+            Find batch axis of every observed activation by comparing activation shapes of 
+                the first micro batch with those of concatenated micro batches.
+            An axis is the batch axis only if it is the only axis changed, 
+                and it changes from size of the micro batch to size of concatenated batch.
+            Return False if batch axis of any observed activation can not be determined.
+        """
+        probed = []
+        for inputs in (micro_batches[0], torch.cat(micro_batches, dim=0)):
+            for hook in hooks.values(): hook.probed_shapes = {}
+            executor.forward(inputs=inputs, hooks=hooks, output_names=output_names)
+            probed.append({name: hook.probed_shapes for name, hook in hooks.items()})
+            for hook in hooks.values(): hook.probed_shapes = None
+
+        single_size, total_size = micro_batches[0].shape[0], sum([batch.shape[0] for batch in micro_batches])
+        for name, hook in hooks.items():
+            hook.batch_axes = {}
+            single_shapes, total_shapes = probed[0][name], probed[1][name]
+            for var_name, total_shape in total_shapes.items():
+                single_shape = single_shapes.get(var_name)
+                if single_shape is None or len(single_shape) != len(total_shape): return False
+                axes = [axis for axis, (s, t) in enumerate(zip(single_shape, total_shape)) if s != t]
+                if len(axes) != 1: return False
+                if single_shape[axes[0]] != single_size or total_shape[axes[0]] != total_size: return False
+                hook.batch_axes[var_name] = axes[0]
+        return True
+
     def calibrate(self, desc: str, dataloader: Iterable, executor: BaseGraphExecutor, 
         hooks:Dict[str, RuntimeHook], output_names: List[str] = None):
 
-        calib_step = 0
+        calib_step, micro_batches = 0, []
+        coalescing, probed = self._micro_batch > 1, False
+        calib_hooks = {name: hook for name, hook in hooks.items() if isinstance(hook, CalibrationHook)}
         with tqdm(total=self._calib_steps, desc=desc) as progressing_bar:
             for calib_epoch in range(ceil(self._calib_steps / len(dataloader))):
                 for data in dataloader:
                     if self._collate_fn is not None:
                         data = self._collate_fn(data)
-                    executor.forward(inputs=data, hooks=hooks,
-                        output_names=output_names)
-                    progressing_bar.update()
                     calib_step += 1
+
+                    # 将多个 batch 沿 batch 维度拼接为一次前向执行，以减少小 batch 下的 kernel launch 开销
+                    # CalibrationHook 会将激活值沿各自的 batch 维度切分后再送入 observer，
+                    # batch 维度由第一组 batch 的一次探测确定，无法确定时退回逐个 batch 执行
+                    # concatenate micro batches along batch dim and run them with a single forward.
+                    # CalibrationHook splits activations back into micro batches along their batch axis before observing,
+                    # batch axes are probed with the first group, fall back to per batch forward if probing fails.
+                    if coalescing and isinstance(data, torch.Tensor):
+                        micro_batches.append(data)
+                        if len(micro_batches) >= self._micro_batch or calib_step >= self._calib_steps:
+                            if not probed and len(micro_batches) > 1:
+                                probed = True
+                                coalescing = self.probe_batch_axes(
+                                    executor=executor, micro_batches=micro_batches, 
+                                    hooks=calib_hooks, output_names=output_names)
+                                if not coalescing: ppq_warning(
+                                    f'{desc}: batch axis of some observed activations can not be determined, '
+                                    'calibration_micro_batch is ignored and batches are executed one by one.')
+
+                            if coalescing and len(micro_batches) > 1:
+                                sizes = [micro_batch.shape[0] for micro_batch in micro_batches]
+                                for hook in calib_hooks.values(): hook.micro_batch_sizes = sizes
+                                executor.forward(inputs=torch.cat(micro_batches, dim=0), hooks=hooks,
+                                    output_names=output_names)
+                                for hook in calib_hooks.values(): hook.micro_batch_sizes = None
+                            else:
+                                for micro_batch in micro_batches:
+                                    executor.forward(inputs=micro_batch, hooks=hooks,
+                                        output_names=output_names)
+                            progressing_bar.update(len(micro_batches))
+                            micro_batches.clear()
+                    elif len(micro_batches) > 0:
+                        # coalescing is given up, or data is not a single tensor, flush pending batches first.
+                        for micro_batch in micro_batches + [data]:
+                            executor.forward(inputs=micro_batch, hooks=hooks,
+                                output_names=output_names)
+                        progressing_bar.update(len(micro_batches) + 1)
+                        micro_batches.clear()
+                    else:
+                        executor.forward(inputs=data, hooks=hooks,
+                            output_names=output_names)
+                        progressing_bar.update()
                     if calib_step >= self._calib_steps: break
 
     @ empty_ppq_cache
@@ -73,6 +148,7 @@ class RuntimeCalibrationPass(QuantizationOptimizationPass):
     ) -> None:
         self._collate_fn = collate_fn
         self._calib_steps = calib_steps
+        self._micro_batch = kwargs.get('calibration_micro_batch', 1)
         assert calib_steps >= 8, 'Insufficient Calibration Detected, to better quantize your network, '\
             'more calibration steps is demonded, we strongly recommend you to prepare more calibration data '\
             'and more calibration steps is perferred here. (at least 8)'
@@ -177,6 +253,7 @@ class RuntimePerlayerCalibrationPass(RuntimeCalibrationPass):
         executor: BaseGraphExecutor, calib_steps: int, collate_fn: Callable, **kwargs) -> None:
         self._collate_fn = collate_fn
         self._calib_steps = calib_steps
+        self._micro_batch = kwargs.get('calibration_micro_batch', 1)
         assert calib_steps >= 8, 'Insufficient Calibration Detected, to better quantize your network, '\
             'more calibration steps is demonded, we strongly recommend you to prepare more calibration data '\
             'and more calibration steps is perferred here. (at least 8)'
@@ -185,7 +262,8 @@ class RuntimePerlayerCalibrationPass(RuntimeCalibrationPass):
             'calibration steps. More calibraiton steps will greatly delay ppq\'s calibration procedure. '\
             'Reset your calib_steps parameter please.'
 
-        for operation in tqdm(processer.graph.topological_sort(), 
+        # executor has sorted graph in load_graph, reuse its executing order here.
+        for operation in tqdm(executor._executing_order, 
                               desc='Runtime Calibration(Per Layer)'):
             
             if not isinstance(operation, QuantableOperation): continue
@@ -233,6 +311,7 @@ class PPLDSPTIReCalibrationPass(RuntimeCalibrationPass):
         executor: BaseGraphExecutor, calib_steps: int, collate_fn: Callable, **kwargs) -> None:
         self._collate_fn = collate_fn
         self._calib_steps = calib_steps
+        self._micro_batch = kwargs.get('calibration_micro_batch', 1)
         assert calib_steps >= 8, 'Insufficient Calibration Detected, to better quantize your network, '\
             'more calibration steps is demonded, we strongly recommend you to prepare more calibration data '\
             'and more calibration steps is perferred here. (at least 8)'
@@ -242,7 +321,8 @@ class PPLDSPTIReCalibrationPass(RuntimeCalibrationPass):
             'Reset your calib_steps parameter please.'
 
         hooks = {}
-        for operation in tqdm(processer.graph.topological_sort(), 
+        # executor has sorted graph in load_graph, reuse its executing order here.
+        for operation in tqdm(executor._executing_order, 
                               desc='Collecting Observer For Computing Ops'):
             
             if not isinstance(operation, QuantableOperation) or not operation.is_computing_op: continue
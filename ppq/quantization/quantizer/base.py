@@ -184,6 +184,17 @@ class BaseQuantizer(metaclass = ABCMeta):
     def quant_operation_types(self) -> set:
         raise NotImplementedError('Quantizier does not have a quantable op set yet.') 
 
+    @ classmethod
+    def static_quant_operation_types(cls) -> set:
+        """
+            不经过初始化直接读取量化器的 quant_operation_types，调度器只需要这一属性，没有必要为此创建一个完整的量化器
+            read quant_operation_types without initializing a quantizer,
+                graph dispatcher needs nothing more than this property.
+
+            ATTENTION: quant_operation_types of your quantizer should not rely on any attribute created in __init__.
+        """
+        return cls.quant_operation_types.fget(cls.__new__(cls))
+
     @ abstractproperty
     @ property
     def target_platform(self) -> TargetPlatform:
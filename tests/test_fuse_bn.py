@@ -0,0 +1,73 @@
+# 检查 GraphMerger.fuse_bn 的数值正确性：融合前后网络输出应当一致
+# check numerical correctness of GraphMerger.fuse_bn: network output should not change after fusion.
+
+import numpy as np
+import onnx
+import torch
+from onnx import helper, numpy_helper
+from ppq.executor import TorchExecutor
+from ppq.IR import GraphCommand, GraphCommandType, GraphMerger
+from ppq.parser.onnx_parser import OnnxParser
+
+DEVICE  = 'cuda' if torch.cuda.is_available() else 'cpu'
+EPSILON = 1e-2 # non-default epsilon, fuse_bn must read it from bn attributes.
+
+# tf32 convolution / matmul is not precise enough for comparing outputs.
+torch.backends.cudnn.allow_tf32 = False
+torch.backends.cuda.matmul.allow_tf32 = False
+
+# case name, computing op type, input shape, weight shape, has bias, attributes, output channel
+TEST_CASES = [
+    ('Conv',                   'Conv',          [2, 4, 8, 8], [6, 4, 3, 3], True,  {'pads': [1, 1, 1, 1]},           6),
+    ('Conv(group=2)',          'Conv',          [2, 4, 8, 8], [6, 2, 3, 3], False, {'group': 2},                      6),
+    ('ConvTranspose',          'ConvTranspose', [2, 4, 8, 8], [4, 6, 3, 3], True,  {'strides': [2, 2]},               6),
+    ('ConvTranspose(group=2)', 'ConvTranspose', [2, 4, 8, 8], [4, 3, 3, 3], False, {'group': 2, 'strides': [2, 2]},   6),
+    ('Gemm(transB=1)',         'Gemm',          [2, 5],       [7, 5],       True,  {'transB': 1},                     7),
+    ('Gemm(transB=0)',         'Gemm',          [2, 5],       [5, 7],       False, {'transB': 0},                     7),
+    ('Gemm(alpha, beta)',      'Gemm',          [2, 5],       [7, 5],       True,  {'transB': 1, 'alpha': 2.0, 'beta': 0.5}, 7),
+    ('Gemm(beta=0)',           'Gemm',          [2, 5],       [7, 5],       True,  {'transB': 1, 'beta': 0.0},        7),
+]
+
+def build_model(op_type: str, input_shape: list, weight_shape: list,
+    has_bias: bool, attributes: dict, num_of_channel: int) -> onnx.ModelProto:
+    initializers = [
+        numpy_helper.from_array(np.random.randn(*weight_shape).astype(np.float32), 'w'),
+        numpy_helper.from_array(np.random.rand(num_of_channel).astype(np.float32) + 0.5,  'alpha'),
+        numpy_helper.from_array(np.random.randn(num_of_channel).astype(np.float32),       'beta'),
+        numpy_helper.from_array(np.random.randn(num_of_channel).astype(np.float32),       'mean'),
+        numpy_helper.from_array(np.random.rand(num_of_channel).astype(np.float32) + 0.1, 'var')]
+    computing_inputs = ['x', 'w']
+    if has_bias:
+        initializers.append(numpy_helper.from_array(np.random.randn(num_of_channel).astype(np.float32), 'b'))
+        computing_inputs.append('b')
+
+    nodes = [
+        helper.make_node(op_type, computing_inputs, ['y'], name='computing', **attributes),
+        helper.make_node('BatchNormalization', ['y', 'alpha', 'beta', 'mean', 'var'], ['z'],
+                         name='bn', epsilon=EPSILON)]
+    graph = helper.make_graph(
+        nodes, 'fuse_bn_test',
+        inputs=[helper.make_tensor_value_info('x', onnx.TensorProto.FLOAT, input_shape)],
+        outputs=[helper.make_tensor_value_info('z', onnx.TensorProto.FLOAT, None)],
+        initializer=initializers)
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid('', 11)])
+
+for case_name, op_type, input_shape, weight_shape, has_bias, attributes, num_of_channel in TEST_CASES:
+    print(f'Testing fuse_bn with {case_name}')
+    model = build_model(op_type, input_shape, weight_shape, has_bias, attributes, num_of_channel)
+    inputs = torch.randn(size=input_shape, device=DEVICE)
+
+    reference_graph = OnnxParser().build_from_proto(model)
+    reference = TorchExecutor(graph=reference_graph, device=DEVICE).forward(inputs=inputs)[0]
+
+    fused_graph = OnnxParser().build_from_proto(model)
+    processer = GraphMerger(fused_graph)
+    processer(GraphCommand(GraphCommandType.FUSE_BN))
+    assert all(op.type != 'BatchNormalization' for op in fused_graph.operations.values()), (
+        f'BatchNormalization is not fused with {case_name}')
+    fused = TorchExecutor(graph=fused_graph, device=DEVICE).forward(inputs=inputs)[0]
+
+    assert reference.shape == fused.shape, (
+        f'Output shape mismatch with {case_name}: {reference.shape} vs {fused.shape}')
+    error = ((reference - fused).abs().max() / reference.abs().max()).item()
+    assert error < 1e-4, f'fuse_bn changes network output with {case_name}, relative error {error}'